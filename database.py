@@ -1,14 +1,74 @@
+import os
 import sqlite3
+import threading
 import json
 import pickle
-from typing import List, Dict, Any, Optional
+from dataclasses import dataclass
+from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime
+import numpy as np
+from services.content_analysis import analyze_screenshot_content, CONTENT_ANALYSIS_VERSION
 
 DATABASE_PATH = "visual_memory_search.db"
 
+def serialize_embedding(embedding) -> bytes:
+    """Serialize an embedding as raw float32 bytes."""
+    return np.ascontiguousarray(embedding, dtype=np.float32).tobytes()
+
+def deserialize_embedding(blob: bytes) -> np.ndarray:
+    """Load an embedding blob as a float32 array without copying."""
+    # Rows written before the float32 format hold pickled lists of floats
+    if blob[:1] == b'\x80' and blob[-1:] == b'.':
+        try:
+            return np.asarray(pickle.loads(blob), dtype=np.float32)
+        except Exception:
+            pass
+    return np.frombuffer(blob, dtype=np.float32)
+
+def normalize_embedding(embedding) -> np.ndarray:
+    """Scale an embedding to unit length; zero vectors stay zero."""
+    vec = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm > 0 else vec
+
+def prepare_search_text(ocr_text: str, visual_description: str) -> Tuple[str, str, str]:
+    """Lowercase screenshot text and analyze its content for search.
+
+    Returns the lowercased OCR text and visual description, and the content
+    analysis as JSON.
+    """
+    ocr_text_lower = ocr_text.lower()
+    visual_description_lower = visual_description.lower()
+    content_analysis = analyze_screenshot_content(ocr_text_lower, visual_description_lower)
+    return ocr_text_lower, visual_description_lower, json.dumps(content_analysis)
+
+def is_current_analysis(content_analysis_json: Optional[str]) -> bool:
+    """Check whether a stored content analysis was made by the current analyzer."""
+    if content_analysis_json is None:
+        return False
+    content_analysis = json.loads(content_analysis_json)
+    return content_analysis.get('analysis_version') == CONTENT_ANALYSIS_VERSION
+
+@dataclass
+class EmbeddingMatrix:
+    """Processed screenshots with their embeddings stacked row by row."""
+    screenshots: List[Dict[str, Any]]
+    embeddings: np.ndarray  # (N, D) float32, unit-length rows
+
 class DatabaseManager:
     def __init__(self):
         self.db_path = DATABASE_PATH
+        # Long-lived connection used only to watch for changes to the database
+        self._version_conn = None
+        self._version_lock = threading.Lock()
+        
+        # Embedding matrix cache, rebuilt when the corpus version changes
+        self._embedding_matrix = None
+        self._embedding_matrix_version = None
+        self._embedding_matrix_lock = threading.Lock()
+        
+        # Whether the FTS5 OCR text index exists, checked until it is found
+        self._has_text_index = False
     
     def get_connection(self):
         """Get database connection."""
@@ -16,32 +76,52 @@ class DatabaseManager:
         conn.row_factory = sqlite3.Row  # Enable dict-like access
         return conn
     
-    def create_screenshot(self, screenshot_id: str, filename: str, file_path: str):
+    def get_corpus_version(self) -> int:
+        """Get a version number that changes whenever the database is modified.
+        
+        SQLite's data_version changes when any other connection commits, so
+        writes from this process and from other worker processes are both seen.
+        """
+        with self._version_lock:
+            if self._version_conn is None:
+                self._version_conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            return self._version_conn.execute("PRAGMA data_version").fetchone()[0]
+    
+    def create_screenshot(self, screenshot_id: str, filename: str, file_path: str, preview_url: str):
         """Create a new screenshot record."""
         conn = self.get_connection()
         try:
+            # search_rowid numbers rows in insertion order for the text index
             conn.execute("""
-                INSERT INTO screenshots (id, filename, file_path, upload_date)
-                VALUES (?, ?, ?, ?)
-            """, (screenshot_id, filename, file_path, datetime.now().isoformat()))
+                INSERT INTO screenshots (id, filename, file_path, preview_url, upload_date, search_rowid)
+                VALUES (?, ?, ?, ?, ?, (SELECT IFNULL(MAX(search_rowid), 0) + 1 FROM screenshots))
+            """, (screenshot_id, filename, file_path, preview_url, datetime.now().isoformat()))
             conn.commit()
         finally:
             conn.close()
     
     def update_screenshot_processing(self, screenshot_id: str, ocr_text: str, 
-                                   visual_description: str, text_embedding: List[float]):
+                                   visual_description: str, text_embedding: np.ndarray):
         """Update screenshot with processing results."""
         conn = self.get_connection()
         try:
-            # Convert embedding to binary format for storage
-            embedding_blob = pickle.dumps(text_embedding)
+            # Stored embeddings are unit length, so a dot product gives the cosine
+            text_embedding = normalize_embedding(text_embedding)
+            embedding_blob = serialize_embedding(text_embedding)
+            
+            # Query-independent search fields are computed once here
+            ocr_text_lower, visual_description_lower, content_analysis_json = prepare_search_text(
+                ocr_text, visual_description
+            )
             
             conn.execute("""
                 UPDATE screenshots 
                 SET processed = TRUE, ocr_text = ?, visual_description = ?, 
-                    text_embedding = ?
+                    text_embedding = ?,
+                    ocr_text_lower = ?, visual_description_lower = ?, content_analysis_json = ?
                 WHERE id = ?
-            """, (ocr_text, visual_description, embedding_blob, screenshot_id))
+            """, (ocr_text, visual_description, embedding_blob,
+                  ocr_text_lower, visual_description_lower, content_analysis_json, screenshot_id))
             conn.commit()
         finally:
             conn.close()
@@ -51,7 +131,7 @@ class DatabaseManager:
         conn = self.get_connection()
         try:
             cursor = conn.execute("""
-                SELECT id, filename, file_path, upload_date, processed
+                SELECT id, filename, file_path, preview_url, upload_date, processed
                 FROM screenshots
                 ORDER BY upload_date DESC
             """)
@@ -64,8 +144,9 @@ class DatabaseManager:
         conn = self.get_connection()
         try:
             cursor = conn.execute("""
-                SELECT id, filename, file_path, ocr_text, visual_description, 
-                       text_embedding, upload_date
+                SELECT id, filename, file_path, preview_url, ocr_text, visual_description, 
+                       text_embedding, upload_date,
+                       ocr_text_lower, visual_description_lower, content_analysis_json
                 FROM screenshots
                 WHERE processed = TRUE
             """)
@@ -75,13 +156,111 @@ class DatabaseManager:
                 row_dict = dict(row)
                 # Deserialize embedding
                 if row_dict['text_embedding']:
-                    row_dict['text_embedding'] = pickle.loads(row_dict['text_embedding'])
+                    row_dict['text_embedding'] = deserialize_embedding(row_dict['text_embedding'])
+                else:
+                    row_dict['text_embedding'] = None
+                
+                # Load search text and content analysis, computing them for rows that predate them
+                if not is_current_analysis(row_dict['content_analysis_json']):
+                    (row_dict['ocr_text_lower'], row_dict['visual_description_lower'],
+                     row_dict['content_analysis_json']) = prepare_search_text(
+                        row_dict['ocr_text'] or '', row_dict['visual_description'] or ''
+                    )
+                row_dict['content_analysis'] = json.loads(row_dict.pop('content_analysis_json'))
                 results.append(row_dict)
             
             return results
         finally:
             conn.close()
     
+    def count_processed_screenshots(self) -> int:
+        """Count processed screenshots without loading them."""
+        conn = self.get_connection()
+        try:
+            cursor = conn.execute("SELECT COUNT(*) FROM screenshots WHERE processed = TRUE")
+            return cursor.fetchone()[0]
+        finally:
+            conn.close()
+    
+    def find_screenshots_by_text(self, text_lower: str, limit: Optional[int]) -> List[Dict[str, Any]]:
+        """Find processed screenshots whose lowercased OCR text contains text_lower.
+        
+        Shorter OCR texts come first, as they match the text more closely;
+        ties keep insertion order. Each row includes the OCR text length.
+        A limit of None returns every match.
+        """
+        # SQLite treats a negative LIMIT as no limit
+        row_limit = -1 if limit is None else max(limit, 0)
+        conn = self.get_connection()
+        try:
+            # Only a found index is remembered; init_db may create it after this manager
+            if not self._has_text_index:
+                self._has_text_index = conn.execute("""
+                    SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'screenshots_fts'
+                """).fetchone() is not None
+            
+            # The trigram index only narrows down texts for needles of 3+ characters;
+            # instr keeps the match an exact substring test either way
+            if self._has_text_index and len(text_lower) >= 3:
+                cursor = conn.execute("""
+                    SELECT s.id, s.filename, s.preview_url, s.ocr_text, s.visual_description,
+                           length(s.ocr_text_lower) AS text_length
+                    FROM screenshots_fts
+                    JOIN screenshots s ON s.search_rowid = screenshots_fts.rowid
+                    WHERE screenshots_fts MATCH ? AND s.processed = TRUE
+                          AND instr(s.ocr_text_lower, ?) > 0
+                    ORDER BY text_length, s.search_rowid
+                    LIMIT ?
+                """, ('"' + text_lower.replace('"', '""') + '"', text_lower, row_limit))
+            else:
+                # Every text contains the empty string equally well
+                order = "text_length, search_rowid" if text_lower else "search_rowid"
+                cursor = conn.execute(f"""
+                    SELECT id, filename, preview_url, ocr_text, visual_description,
+                           length(ocr_text_lower) AS text_length
+                    FROM screenshots
+                    WHERE processed = TRUE AND instr(ocr_text_lower, ?) > 0
+                    ORDER BY {order}
+                    LIMIT ?
+                """, (text_lower, row_limit))
+            return [dict(row) for row in cursor.fetchall()]
+        finally:
+            conn.close()
+    
+    def get_embedding_matrix(self) -> EmbeddingMatrix:
+        """Get processed screenshots with a cached, contiguous embedding matrix.
+        
+        The matrix is rebuilt only after the database changes, so searches do
+        not reload and decode every embedding.
+        """
+        version = self.get_corpus_version()
+        with self._embedding_matrix_lock:
+            if self._embedding_matrix is None or self._embedding_matrix_version != version:
+                self._embedding_matrix = self._build_embedding_matrix()
+                self._embedding_matrix_version = version
+            return self._embedding_matrix
+    
+    def _build_embedding_matrix(self) -> EmbeddingMatrix:
+        """Stack the embeddings of all processed screenshots."""
+        screenshots = [
+            screenshot for screenshot in self.get_all_processed_screenshots()
+            if screenshot['text_embedding'] is not None
+        ]
+        
+        if not screenshots:
+            return EmbeddingMatrix(
+                screenshots=[],
+                embeddings=np.zeros((0, 0), dtype=np.float32)
+            )
+        
+        # Embeddings were normalized when stored, so they are stacked as-is
+        embeddings = np.stack([screenshot.pop('text_embedding') for screenshot in screenshots])
+        
+        return EmbeddingMatrix(
+            screenshots=screenshots,
+            embeddings=np.ascontiguousarray(embeddings, dtype=np.float32)
+        )
+    
     def create_processing_job(self, job_id: str, total: int):
         """Create a new processing job."""
         conn = self.get_connection()
@@ -162,26 +341,44 @@ class DatabaseManager:
 
 def init_db():
     """Initialize the database with required tables."""
-    conn = sqlite3.connect(DATABASE_PATH)
+    # Several server workers may start at once; waiting on the write lock lets
+    # the first one migrate while the others wait and then find nothing to do
+    conn = sqlite3.connect(DATABASE_PATH, timeout=600)
     
     try:
+        conn.execute("BEGIN IMMEDIATE")
+        
         # Create screenshots table
         conn.execute("""
             CREATE TABLE IF NOT EXISTS screenshots (
                 id TEXT PRIMARY KEY,
                 filename TEXT NOT NULL,
                 file_path TEXT NOT NULL,
+                preview_url TEXT,
                 upload_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 processed BOOLEAN DEFAULT FALSE,
                 ocr_text TEXT,
                 visual_description TEXT,
                 text_embedding BLOB,
+                ocr_text_lower TEXT,
+                visual_description_lower TEXT,
+                content_analysis_json TEXT,
+                search_rowid INTEGER,
                 file_size INTEGER,
                 image_width INTEGER,
                 image_height INTEGER
             )
         """)
         
+        # Add columns introduced after the table was first created
+        _add_missing_columns(conn, 'screenshots', {
+            'preview_url': 'TEXT',
+            'ocr_text_lower': 'TEXT',
+            'visual_description_lower': 'TEXT',
+            'content_analysis_json': 'TEXT',
+            'search_rowid': 'INTEGER',
+        })
+        
         # Create processing_jobs table
         conn.execute("""
             CREATE TABLE IF NOT EXISTS processing_jobs (
@@ -205,8 +402,135 @@ def init_db():
             ON screenshots(upload_date)
         """)
         
+        conn.execute("""
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_screenshots_search_rowid
+            ON screenshots(search_rowid)
+        """)
+        
+        _migrate_embeddings(conn)
+        _backfill_preview_urls(conn)
+        _backfill_search_text(conn)
+        _backfill_search_rowids(conn)
+        _create_text_index(conn)
+        
         conn.commit()
         print("Database initialized successfully")
         
     finally:
         conn.close()
+
+def _add_missing_columns(conn, table: str, columns: Dict[str, str]):
+    """Add columns that are missing from an existing table."""
+    existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+    for name, column_type in columns.items():
+        if name not in existing:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {column_type}")
+
+def _migrate_embeddings(conn):
+    """Rewrite pickled or unnormalized embeddings as unit-length float32 blobs."""
+    cursor = conn.execute("""
+        SELECT id, text_embedding FROM screenshots
+        WHERE text_embedding IS NOT NULL
+    """)
+    for screenshot_id, blob in cursor.fetchall():
+        embedding = deserialize_embedding(blob)
+        norm = np.linalg.norm(embedding)
+        if norm > 0 and abs(norm - 1) > 1e-4:
+            embedding = normalize_embedding(embedding)
+        converted = serialize_embedding(embedding)
+        if converted != blob:
+            conn.execute("""
+                UPDATE screenshots SET text_embedding = ? WHERE id = ?
+            """, (converted, screenshot_id))
+
+def _backfill_preview_urls(conn):
+    """Fill in preview URLs for rows created before they were stored."""
+    cursor = conn.execute("""
+        SELECT id, file_path FROM screenshots WHERE preview_url IS NULL
+    """)
+    for screenshot_id, file_path in cursor.fetchall():
+        # Same format as FileManager.get_preview_url
+        conn.execute("""
+            UPDATE screenshots SET preview_url = ? WHERE id = ?
+        """, (f"/uploads/{os.path.basename(file_path)}", screenshot_id))
+
+def _backfill_search_text(conn):
+    """Fill in lowercased text and content analysis for processed rows missing them."""
+    cursor = conn.execute("""
+        SELECT id, ocr_text, visual_description, content_analysis_json FROM screenshots
+        WHERE processed = TRUE
+    """)
+    for screenshot_id, ocr_text, visual_description, content_analysis_json in cursor.fetchall():
+        if is_current_analysis(content_analysis_json):
+            continue
+        conn.execute("""
+            UPDATE screenshots
+            SET ocr_text_lower = ?, visual_description_lower = ?, content_analysis_json = ?
+            WHERE id = ?
+        """, prepare_search_text(ocr_text or '', visual_description or '') + (screenshot_id,))
+
+def _backfill_search_rowids(conn):
+    """Number rows created before search_rowid existed, keeping their insertion order."""
+    next_rowid = conn.execute("""
+        SELECT IFNULL(MAX(search_rowid), 0) + 1 FROM screenshots
+    """).fetchone()[0]
+    cursor = conn.execute("""
+        SELECT id FROM screenshots WHERE search_rowid IS NULL ORDER BY rowid
+    """)
+    for offset, (screenshot_id,) in enumerate(cursor.fetchall()):
+        conn.execute("""
+            UPDATE screenshots SET search_rowid = ? WHERE id = ?
+        """, (next_rowid + offset, screenshot_id))
+
+def _create_text_index(conn):
+    """Create the FTS5 trigram index over lowercased OCR text, kept in sync by triggers.
+    
+    screenshots has a TEXT primary key, so its rowid is implicit and VACUUM may
+    renumber it. The index is keyed on search_rowid instead, which never changes.
+    """
+    row = conn.execute("""
+        SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'screenshots_fts'
+    """).fetchone()
+    if row is not None:
+        if "content_rowid='search_rowid'" in row[0]:
+            return
+        
+        # Replace an index keyed on the implicit rowid
+        for trigger in ('screenshots_fts_insert', 'screenshots_fts_delete', 'screenshots_fts_update'):
+            conn.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        conn.execute("DROP TABLE IF EXISTS screenshots_fts")
+    
+    try:
+        conn.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS screenshots_fts USING fts5(
+                ocr_text_lower,
+                content='screenshots', content_rowid='search_rowid',
+                tokenize='trigram case_sensitive 1'
+            )
+        """)
+    except sqlite3.OperationalError as e:
+        # FTS5 or the trigram tokenizer is missing from this SQLite build
+        print(f"Warning: OCR text index unavailable: {str(e)}")
+        return
+    
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS screenshots_fts_insert AFTER INSERT ON screenshots BEGIN
+            INSERT INTO screenshots_fts(rowid, ocr_text_lower) VALUES (new.search_rowid, new.ocr_text_lower);
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS screenshots_fts_delete AFTER DELETE ON screenshots BEGIN
+            INSERT INTO screenshots_fts(screenshots_fts, rowid, ocr_text_lower)
+            VALUES ('delete', old.search_rowid, old.ocr_text_lower);
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS screenshots_fts_update AFTER UPDATE OF ocr_text_lower ON screenshots BEGIN
+            INSERT INTO screenshots_fts(screenshots_fts, rowid, ocr_text_lower)
+            VALUES ('delete', old.search_rowid, old.ocr_text_lower);
+            INSERT INTO screenshots_fts(rowid, ocr_text_lower) VALUES (new.search_rowid, new.ocr_text_lower);
+        END
+    """)
+    
+    # Index the rows that already exist
+    conn.execute("INSERT INTO screenshots_fts(screenshots_fts) VALUES ('rebuild')")
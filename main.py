@@ -34,7 +34,7 @@ app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
 
 # Initialize services
 db_manager = DatabaseManager()
-image_processor = ImageProcessor()
+image_processor = ImageProcessor.get_instance()
 search_service = SearchService(db_manager)
 file_manager = FileManager()
 
@@ -59,6 +59,7 @@ async def initialize_database_async():
         loop = asyncio.get_event_loop()
         await loop.run_in_executor(None, init_db)
         print("Database initialized successfully")
+        await loop.run_in_executor(None, image_processor.warm_up)
         print("Visual Memory Search API started successfully")
     except Exception as e:
         print(f"Database initialization error: {e}")
@@ -140,7 +141,7 @@ async def readiness_check():
     """Readiness check endpoint for deployment systems."""
     try:
         # Quick database connectivity check
-        db_manager.get_all_processed_screenshots()
+        db_manager.count_processed_screenshots()
         return JSONResponse(
             content={"status": "ready", "service": "Visual Memory Search", "database": "connected"},
             status_code=200
@@ -215,7 +216,8 @@ async def process_saved_files_background(job_id: str, saved_files: List[dict]):
             db_manager.create_screenshot(
                 screenshot_id=file_info['screenshot_id'],
                 filename=file_info['filename'],
-                file_path=file_info['file_path']
+                file_path=file_info['file_path'],
+                preview_url=file_manager.get_preview_url(file_info['file_path'])
             )
             
             # Process image (OCR + visual description)
@@ -288,7 +290,7 @@ async def search_screenshots(request: SearchRequest):
         
         return {
             "results": results,
-            "total_searched": len(db_manager.get_all_processed_screenshots()),
+            "total_searched": db_manager.count_processed_screenshots(),
             "query_time_ms": query_time_ms
         }
     except Exception as e:
@@ -307,7 +309,7 @@ async def get_all_screenshots():
                 "filename": s["filename"],
                 "upload_date": s["upload_date"],
                 "processed": bool(s["processed"]),
-                "preview_url": f"/uploads/{os.path.basename(s['file_path'])}"
+                "preview_url": s["preview_url"]
             }
             for s in screenshots
         ],
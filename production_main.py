@@ -76,7 +76,8 @@ def init_services():
         
         # Initialize services
         _db_manager = DatabaseManager()
-        _image_processor = ImageProcessor()
+        _image_processor = ImageProcessor.get_instance()
+        _image_processor.warm_up()
         _search_service = SearchService(_db_manager)
         _file_manager = FileManager()
         
@@ -208,7 +209,8 @@ async def process_saved_files_background(job_id: str, saved_files: List[dict]):
             _db_manager.create_screenshot(
                 screenshot_id=file_info['screenshot_id'],
                 filename=file_info['filename'],
-                file_path=file_info['file_path']
+                file_path=file_info['file_path'],
+                preview_url=_file_manager.get_preview_url(file_info['file_path'])
             )
             
             # Process image
@@ -286,7 +288,7 @@ async def search_screenshots(request: dict):
         
         return {
             "results": results,
-            "total_searched": len(_db_manager.get_all_processed_screenshots()),
+            "total_searched": _db_manager.count_processed_screenshots(),
             "query_time_ms": query_time_ms
         }
     except Exception as e:
@@ -310,7 +312,7 @@ async def get_all_screenshots():
                 "filename": s["filename"],
                 "upload_date": s["upload_date"],
                 "processed": bool(s["processed"]),
-                "preview_url": f"/uploads/{os.path.basename(s['file_path'])}"
+                "preview_url": s["preview_url"]
             }
             for s in screenshots
         ],
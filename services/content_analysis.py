@@ -0,0 +1,101 @@
+from typing import Any, Dict
+from services.keyword_matcher import KeywordMatcher
+
+# Bumped when the analysis changes so stored analyses are recomputed
+CONTENT_ANALYSIS_VERSION = 2
+
+# Query keywords by content category; ordered, as matched terms are reported in this order
+VISUAL_KEYWORDS = {
+    'nature': ('mountain', 'mountains', 'river', 'lake', 'forest', 'tree', 'landscape', 'nature', 'outdoor', 'scenery', 'beach', 'ocean', 'sea', 'sky', 'sunset', 'sunrise'),
+    'urban': ('building', 'city', 'street', 'road', 'architecture', 'urban', 'downtown'),
+    'people': ('person', 'people', 'man', 'woman', 'child', 'group', 'face'),
+    'objects': ('car', 'vehicle', 'food', 'animal', 'bird', 'cat', 'dog'),
+    'general_visual': ('picture', 'photo', 'image', 'show', 'display', 'view')
+}
+
+CONTENT_TERM_MATCHER = KeywordMatcher(
+    keyword for keywords in VISUAL_KEYWORDS.values() for keyword in keywords
+)
+
+# UI/Interface indicators in screenshot text
+UI_INDICATORS = frozenset({'button', 'form', 'login', 'error', 'dialog', 'menu', 'interface', 'click', 'text field', 'dropdown', 'checkbox', 'authentication', 'password', 'username', 'sign in', 'alert', 'warning'})
+
+# Visual content indicators in screenshot text
+NATURE_INDICATORS = frozenset({'mountain', 'river', 'lake', 'forest', 'tree', 'landscape', 'nature', 'outdoor', 'scenery', 'beach', 'ocean', 'sea', 'sky', 'sunset', 'sunrise', 'valley', 'peak', 'hill'})
+URBAN_INDICATORS = frozenset({'building', 'city', 'street', 'road', 'architecture', 'urban', 'downtown', 'skyscraper'})
+PEOPLE_INDICATORS = frozenset({'person', 'people', 'man', 'woman', 'child', 'face', 'group', 'individual'})
+
+# Content that is irrelevant to auth/error and UI queries
+IRRELEVANT_PATTERNS = frozenset({
+    # Nature patterns
+    'landscape', 'mountain', 'river', 'scenic', 'photograph', 'nature', 'outdoor', 'sunset', 'sunrise', 'valley', 'peak', 'hill', 'forest', 'tree',
+    # Character patterns
+    'panda', 'cartoon', 'cute', 'kawaii', 'character', 'illustration', 'animal'
+})
+
+# Terms the search scoring rules look for
+AUTH_TERMS = frozenset({'auth', 'authentication', 'login', 'password', 'sign in', 'username', 'credential'})
+ERROR_TERMS = frozenset({'error', 'failed', 'warning', 'alert', 'problem', 'invalid'})
+STRICT_ERROR_TERMS = ERROR_TERMS | {'incorrect'}
+NON_AUTH_TERMS = frozenset({'landscape', 'mountain', 'panda', 'cartoon', 'cute', 'kawaii', 'scenic', 'photograph', 'nature', 'animal'})
+UI_TERMS = frozenset({'button', 'form', 'interface', 'menu', 'dialog', 'modal', 'click', 'field', 'dropdown', 'checkbox', 'ui elements'})
+UI_CONTENT_TERMS = UI_TERMS | {'sign in', 'login'}
+NON_UI_TERMS = frozenset({'landscape', 'mountain', 'scenic', 'photograph', 'nature', 'outdoor', 'panda', 'cartoon', 'character'})
+VISUAL_UI_TERMS = frozenset({'button', 'form', 'login', 'interface', 'dialog', 'menu'})
+
+# Flags stored with each analysis and the terms that set them
+RULE_FLAG_TERMS = {
+    'has_auth_terms': AUTH_TERMS,
+    'has_error_terms': ERROR_TERMS,
+    'has_strict_error_terms': STRICT_ERROR_TERMS,
+    'has_non_auth_terms': NON_AUTH_TERMS,
+    'has_ui_terms': UI_TERMS,
+    'has_ui_content_terms': UI_CONTENT_TERMS,
+    'has_non_ui_terms': NON_UI_TERMS,
+    'has_visual_ui_terms': VISUAL_UI_TERMS,
+    'has_irrelevant_terms': IRRELEVANT_PATTERNS,
+}
+
+SCREENSHOT_KEYWORD_MATCHER = KeywordMatcher(
+    UI_INDICATORS.union(NATURE_INDICATORS, URBAN_INDICATORS, PEOPLE_INDICATORS, *RULE_FLAG_TERMS.values())
+)
+
+def analyze_screenshot_content(ocr_text: str, visual_description: str) -> Dict[str, Any]:
+    """Analyze what type of content is in the screenshot.
+
+    Expects lowercased text. The result does not depend on the query, so it
+    is computed once when a screenshot is stored.
+    """
+    combined_text = f"{ocr_text} {visual_description}"
+
+    # Count indicators and set rule flags from a single matcher pass over the text;
+    # multi-word terms can span the OCR text and the description
+    indicators = SCREENSHOT_KEYWORD_MATCHER.find(combined_text)
+    ui_count = len(indicators.intersection(UI_INDICATORS))
+    nature_count = len(indicators.intersection(NATURE_INDICATORS))
+    urban_count = len(indicators.intersection(URBAN_INDICATORS))
+    people_count = len(indicators.intersection(PEOPLE_INDICATORS))
+
+    # Determine primary content type
+    is_primarily_ui = ui_count > 2 or len(ocr_text) > len(visual_description) * 2
+    has_nature_content = nature_count > 0
+    has_urban_content = urban_count > 0
+    has_people_content = people_count > 0
+
+    # Where each content term occurs, preferring the visual description
+    term_locations = dict.fromkeys(CONTENT_TERM_MATCHER.find(ocr_text), 'ocr')
+    term_locations.update(dict.fromkeys(CONTENT_TERM_MATCHER.find(visual_description), 'visual'))
+
+    return {
+        'analysis_version': CONTENT_ANALYSIS_VERSION,
+        'is_primarily_ui': is_primarily_ui,
+        'has_nature_content': has_nature_content,
+        'has_urban_content': has_urban_content,
+        'has_people_content': has_people_content,
+        'nature_count': nature_count,
+        'ui_count': ui_count,
+        'text_to_visual_ratio': len(ocr_text) / max(len(visual_description), 1),
+        'ocr_length': len(ocr_text),
+        'term_locations': term_locations,
+        **{flag: not indicators.isdisjoint(terms) for flag, terms in RULE_FLAG_TERMS.items()}
+    }
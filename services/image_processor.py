@@ -1,5 +1,6 @@
 import os
 import sys
+import threading
 from typing import List
 import pytesseract
 from PIL import Image
@@ -14,6 +15,23 @@ import anthropic
 from anthropic import Anthropic
 
 class ImageProcessor:
+    # Shared instance, so the embedding model is loaded once per process
+    _instance = None
+    _instance_lock = threading.Lock()
+    
+    @classmethod
+    def get_instance(cls) -> 'ImageProcessor':
+        """Get the shared image processor, creating it on first use."""
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    cls._instance = cls()
+        return cls._instance
+    
+    def warm_up(self):
+        """Create one embedding so the first search does not pay model start-up costs."""
+        self.create_embeddings("warmup")
+    
     def __init__(self):
         # Initialize sentence transformer for embeddings if available
         if SENTENCE_TRANSFORMERS_AVAILABLE:
@@ -21,6 +39,10 @@ class ImageProcessor:
         else:
             self.embedding_model = None
         
+        # Searches and ingestion share the model from several threads, and its
+        # tokenizer must not be called concurrently
+        self._model_lock = threading.Lock()
+        
         # Initialize Anthropic client for visual descriptions
         # The newest Anthropic model is "claude-sonnet-4-20250514", not "claude-3-7-sonnet-20250219", "claude-3-5-sonnet-20241022" nor "claude-3-sonnet-20240229". 
         # If the user doesn't specify a model, always prefer using "claude-sonnet-4-20250514" as it is the latest model. However, if the user has already selected "claude-3-7-sonnet-20250219", keep that selection unless they explicitly request a change.
@@ -144,32 +166,37 @@ Keep the description concise but detailed enough for search purposes."""
             print(f"Error generating description for {image_path}: {str(e)}")
             return f"Error generating visual description: {str(e)}"
     
-    def create_embeddings(self, text: str) -> List[float]:
-        """Create vector embeddings for text."""
+    def create_embeddings(self, text: str) -> np.ndarray:
+        """Create vector embeddings for text as a contiguous float32 array."""
         try:
-            if not text.strip():
-                # Return zero vector for empty text
-                return [0.0] * 384  # all-MiniLM-L6-v2 has 384 dimensions
-            
-            if self.embedding_model is not None:
-                # Generate embeddings using sentence-transformers
-                embeddings = self.embedding_model.encode([text])
-                return embeddings[0].tolist()
-            else:
-                # Fallback: simple hash-based embedding for now
-                return self._create_simple_embedding(text)
+            return self.encode_text(text)
         
         except Exception as e:
             print(f"Error creating embeddings: {str(e)}")
             # Return zero vector on error
-            return [0.0] * 384
+            return np.zeros(384, dtype=np.float32)
+    
+    def encode_text(self, text: str) -> np.ndarray:
+        """Create vector embeddings for text, raising if encoding fails."""
+        if not text.strip():
+            # Return zero vector for empty text
+            return np.zeros(384, dtype=np.float32)  # all-MiniLM-L6-v2 has 384 dimensions
+        
+        if self.embedding_model is not None:
+            # Generate embeddings using sentence-transformers
+            with self._model_lock:
+                embeddings = self.embedding_model.encode([text])
+            return np.ascontiguousarray(embeddings[0], dtype=np.float32)
+        else:
+            # Fallback: simple hash-based embedding for now
+            return np.ascontiguousarray(self._create_simple_embedding(text), dtype=np.float32)
     
-    def calculate_similarity(self, embedding1: List[float], embedding2: List[float]) -> float:
+    def calculate_similarity(self, embedding1: np.ndarray, embedding2: np.ndarray) -> float:
         """Calculate cosine similarity between two embeddings."""
         try:
-            # Convert to numpy arrays
-            vec1 = np.array(embedding1)
-            vec2 = np.array(embedding2)
+            # Accept float32 arrays as-is, convert anything else
+            vec1 = np.asarray(embedding1, dtype=np.float32)
+            vec2 = np.asarray(embedding2, dtype=np.float32)
             
             # Calculate cosine similarity
             dot_product = np.dot(vec1, vec2)
@@ -0,0 +1,31 @@
+from typing import Iterable, Set
+try:
+    import ahocorasick
+    AHOCORASICK_AVAILABLE = True
+except ImportError:
+    AHOCORASICK_AVAILABLE = False
+
+class KeywordMatcher:
+    """Find which of a fixed set of keywords occur in a text.
+
+    With pyahocorasick installed, all keywords are matched in one linear pass
+    over the text; otherwise each keyword is checked with a substring test.
+    Both give the same result as {k for k in keywords if k in text}.
+    """
+
+    def __init__(self, keywords: Iterable[str]):
+        self.keywords = tuple(dict.fromkeys(keywords))
+
+        if AHOCORASICK_AVAILABLE and self.keywords:
+            self._automaton = ahocorasick.Automaton()
+            for keyword in self.keywords:
+                self._automaton.add_word(keyword, keyword)
+            self._automaton.make_automaton()
+        else:
+            self._automaton = None
+
+    def find(self, text: str) -> Set[str]:
+        """Get the keywords that occur in the text."""
+        if self._automaton is not None:
+            return {keyword for _, keyword in self._automaton.iter(text)}
+        return {keyword for keyword in self.keywords if keyword in text}
@@ -1,365 +1,438 @@
-import os
-from typing import List, Dict, Any
+import asyncio
+from dataclasses import dataclass
+from typing import List, Dict, Any, Optional, Tuple, Callable
+import numpy as np
 from models import SearchResult
 from services.image_processor import ImageProcessor
+from services.cache import LRUCache
+from services.keyword_matcher import KeywordMatcher
+from services.text_index import TextIndex
+from services.content_analysis import VISUAL_KEYWORDS, RULE_FLAG_TERMS
+from database import normalize_embedding
+
+UI_KEYWORDS = frozenset({'button', 'form', 'login', 'error', 'dialog', 'menu', 'interface', 'screen', 'app', 'website', 'page', 'modal', 'field', 'dropdown', 'checkbox', 'click'})
+
+# Special high-priority combinations
+AUTH_ERROR_KEYWORDS = frozenset({'auth', 'authentication', 'login', 'password', 'sign in', 'credential', 'username'})
+ERROR_KEYWORDS = frozenset({'error', 'warning', 'alert', 'problem', 'issue', 'failed', 'fail'})
+
+QUERY_KEYWORD_MATCHER = KeywordMatcher(
+    [keyword for keywords in VISUAL_KEYWORDS.values() for keyword in keywords] +
+    list(UI_KEYWORDS) + list(AUTH_ERROR_KEYWORDS) + list(ERROR_KEYWORDS)
+)
+
+@dataclass
+class ScreenshotFeatures:
+    """Query-independent search features, one array entry per screenshot."""
+    ocr_index: TextIndex
+    visual_index: TextIndex
+    auth_error_content_scores: np.ndarray  # float64
+    has_ui_terms: np.ndarray  # bool
+    has_non_ui_terms: np.ndarray  # bool
+    is_primarily_ui: np.ndarray  # bool
+    has_nature_content: np.ndarray  # bool
+    has_urban_content: np.ndarray  # bool
+    has_people_content: np.ndarray  # bool
+    auth_error_thresholds: np.ndarray  # float64
+    ui_thresholds: np.ndarray  # float64
+    visual_thresholds: np.ndarray  # float64
 
 class SearchService:
+    # (base, content, text) weights per query type
+    # Auth+error queries prioritize text content
+    AUTH_ERROR_WEIGHTS = (0.3, 0.2, 0.5)
+    # Visual queries prioritize visual content heavily
+    VISUAL_WEIGHTS = (0.2, 0.6, 0.2)
+    # Text queries balance all factors
+    TEXT_WEIGHTS = (0.4, 0.3, 0.3)
+    
+    # Threshold for queries without a specific type
+    DEFAULT_THRESHOLD = 0.2
+    
+    # Number of (query, limit) result lists kept between searches
+    RESULT_CACHE_SIZE = 512
+    
+    # Number of query embeddings and query analyses kept between searches
+    QUERY_EMBEDDING_CACHE_SIZE = 1024
+    QUERY_ANALYSIS_CACHE_SIZE = 1024
+    
     def __init__(self, db_manager):
         self.db_manager = db_manager
-        self.image_processor = ImageProcessor()
+        self.image_processor = ImageProcessor.get_instance()
+        
+        # Search results, valid until the database changes
+        self._result_cache = LRUCache(maxsize=self.RESULT_CACHE_SIZE)
+        self._result_cache_version = None
+        
+        # Normalized query embeddings; these do not depend on the database
+        self._query_vector_cache = LRUCache(maxsize=self.QUERY_EMBEDDING_CACHE_SIZE)
+        self._query_analysis_cache = LRUCache(maxsize=self.QUERY_ANALYSIS_CACHE_SIZE)
+        
+        # (embedding matrix, features) for the most recently searched corpus
+        self._screenshot_features = (None, None)
     
     async def hybrid_search(self, query: str, limit: int = 5) -> List[SearchResult]:
         """Perform intelligent hybrid search with visual content prioritization."""
         try:
-            # Get all processed screenshots
-            screenshots = self.db_manager.get_all_processed_screenshots()
-            
-            if not screenshots:
-                return []
-            
-            # Create query embedding
-            query_embedding = self.image_processor.create_embeddings(query)
+            # Drop cached results once screenshots have been added or changed
+            corpus_version = self.db_manager.get_corpus_version()
+            if corpus_version != self._result_cache_version:
+                self._result_cache.clear()
+                self._result_cache_version = corpus_version
             
-            # Analyze query type and calculate scores
-            scored_results = []
-            query_analysis = self._analyze_query(query)
-            
-            for screenshot in screenshots:
-                if not screenshot.get('text_embedding'):
-                    continue
-                
-                score = self._calculate_relevance_score(
-                    query, query_analysis, screenshot, query_embedding
-                )
-                
-                # Apply stricter filtering based on query type
-                min_threshold = self._get_minimum_threshold(query_analysis, score, screenshot)
-                
-                if score > min_threshold:
-                    result = SearchResult(
-                        id=screenshot['id'],
-                        filename=screenshot['filename'],
-                        confidence_score=round(min(score * 100, 100), 1),
-                        preview_url=f"/uploads/{os.path.basename(screenshot['file_path'])}",
-                        ocr_text=screenshot.get('ocr_text', ''),
-                        visual_description=screenshot.get('visual_description', ''),
-                        matched_elements=self._find_matched_elements(query, query_analysis, screenshot)
-                    )
-                    scored_results.append((score, result))
+            # Results quote the original query, so it is used as-is in the key
+            cache_key = (query, limit)
+            cached_results = self._result_cache.get(cache_key)
+            if cached_results is not None:
+                return list(cached_results)
             
-            # Sort by relevance score (descending)
-            scored_results.sort(key=lambda x: x[0], reverse=True)
+            # Rank in a worker thread so other requests are served meanwhile;
+            # NumPy releases the GIL during the heavy array work
+            results, cacheable = await asyncio.to_thread(self._rank_screenshots, query, limit)
             
-            return [result for _, result in scored_results[:limit]]
+            # Skip caching if the query could not be encoded or the database
+            # changed while ranking
+            if cacheable and self._result_cache_version == corpus_version:
+                self._result_cache.put(cache_key, results)
+            return list(results)
         
         except Exception as e:
             print(f"Search error: {str(e)}")
             return []
     
+    def _rank_screenshots(self, query: str, limit: int) -> Tuple[List[SearchResult], bool]:
+        """Score screenshots against the query and return the top results.
+        
+        Also returns whether the results may be cached, which they may not
+        when the query embedding failed.
+        """
+        # Get all processed screenshots with their cached embedding matrix
+        embedding_matrix = self.db_manager.get_embedding_matrix()
+        screenshots = embedding_matrix.screenshots
+        
+        if not screenshots:
+            return [], True
+        
+        features = self._get_screenshot_features(embedding_matrix)
+        
+        # Rows are unit length, so a dot product with the query vector is the cosine
+        query_vector = self._get_query_vector(query)
+        
+        # A failed embedding gives every screenshot a similarity of 0 for this search only
+        cacheable = query_vector is not None
+        if query_vector is None:
+            query_vector = np.zeros(embedding_matrix.embeddings.shape[1], dtype=np.float32)
+        
+        # Analyze query type and calculate scores
+        query_analysis = self._get_query_analysis(query)
+        
+        # Every score is computed for the whole corpus at once
+        base_scores = (embedding_matrix.embeddings @ query_vector).astype(np.float64)
+        content_scores = self._select_content_scorer(query_analysis)(query_analysis, features)
+        text_scores = self._calculate_text_matching(query_analysis, features)
+        
+        # Weighted final score based on query type
+        base_weight, content_weight, text_weight = self._get_score_weights(query_analysis)
+        scores = (
+            base_scores * base_weight +
+            content_scores * content_weight +
+            text_scores * text_weight
+        )
+        
+        # Apply stricter filtering based on query type
+        candidates = np.flatnonzero(scores > self._select_thresholds(query_analysis, features))
+        
+        # Sort only the top results by relevance score (descending)
+        top_indices = candidates[self._select_top(scores[candidates], limit)]
+        
+        results = [
+            SearchResult(
+                id=screenshots[index]['id'],
+                filename=screenshots[index]['filename'],
+                confidence_score=round(min(float(scores[index]) * 100, 100), 1),
+                preview_url=screenshots[index]['preview_url'],
+                ocr_text=screenshots[index].get('ocr_text', ''),
+                visual_description=screenshots[index].get('visual_description', ''),
+                matched_elements=self._find_matched_elements(query, query_analysis, screenshots[index])
+            )
+            for index in top_indices
+        ]
+        
+        return results, cacheable
+    
+    def _get_query_vector(self, query: str) -> Optional[np.ndarray]:
+        """Get the normalized embedding of a query, creating it only on a cache miss.
+        
+        Returns None if the query cannot be embedded; failures are not cached,
+        so the next search tries again.
+        """
+        query_vector = self._query_vector_cache.get(query)
+        if query_vector is None:
+            try:
+                query_vector = normalize_embedding(self.image_processor.encode_text(query))
+            except Exception as e:
+                print(f"Error creating query embedding: {str(e)}")
+                return None
+            query_vector.flags.writeable = False
+            self._query_vector_cache.put(query, query_vector)
+        return query_vector
+    
+    def _get_query_analysis(self, query: str) -> Dict[str, Any]:
+        """Get the analysis of a query, analyzing it only on a cache miss.
+        
+        Cached analyses are shared between searches and must not be modified.
+        """
+        query_analysis = self._query_analysis_cache.get(query)
+        if query_analysis is None:
+            query_analysis = self._analyze_query(query)
+            self._query_analysis_cache.put(query, query_analysis)
+        return query_analysis
+    
+    def _select_top(self, scores: np.ndarray, limit: Optional[int]) -> np.ndarray:
+        """Get the positions of the highest scores, best first.
+        
+        A linear-time partition finds the cutoff score, so only the top
+        results are sorted. Ties keep the earlier position, as a stable
+        sort of all scores would. A limit of None keeps every score.
+        """
+        if limit is None:
+            limit = len(scores)
+        if limit <= 0:
+            return np.zeros(0, dtype=np.intp)
+        
+        if len(scores) > limit:
+            cutoff = np.partition(scores, len(scores) - limit)[len(scores) - limit]
+            positions = np.flatnonzero(scores >= cutoff)
+        else:
+            positions = np.arange(len(scores))
+        
+        return positions[np.argsort(-scores[positions], kind='stable')][:limit]
+    
+    def _get_screenshot_features(self, embedding_matrix) -> ScreenshotFeatures:
+        """Get the search features of a corpus, rebuilding them when it changes."""
+        cached_matrix, features = self._screenshot_features
+        if cached_matrix is not embedding_matrix:
+            features = self._build_screenshot_features(embedding_matrix.screenshots)
+            self._screenshot_features = (embedding_matrix, features)
+        return features
+    
+    def _build_screenshot_features(self, screenshots: List[Dict]) -> ScreenshotFeatures:
+        """Evaluate the query-independent scoring rules for every screenshot."""
+        # Rule flags were set when each screenshot was analyzed at ingest
+        analyses = [screenshot['content_analysis'] for screenshot in screenshots]
+        rule_flags = {
+            flag: np.array([analysis[flag] for analysis in analyses], dtype=bool)
+            for flag in list(RULE_FLAG_TERMS) + ['is_primarily_ui', 'has_nature_content', 'has_urban_content', 'has_people_content']
+        }
+        ocr_lengths = np.array([analysis['ocr_length'] for analysis in analyses])
+        
+        return ScreenshotFeatures(
+            ocr_index=TextIndex([screenshot['ocr_text_lower'] for screenshot in screenshots]),
+            visual_index=TextIndex([screenshot['visual_description_lower'] for screenshot in screenshots]),
+            auth_error_content_scores=self._auth_error_content_scores(rule_flags),
+            has_ui_terms=rule_flags['has_ui_terms'],
+            has_non_ui_terms=rule_flags['has_non_ui_terms'],
+            is_primarily_ui=rule_flags['is_primarily_ui'],
+            has_nature_content=rule_flags['has_nature_content'],
+            has_urban_content=rule_flags['has_urban_content'],
+            has_people_content=rule_flags['has_people_content'],
+            auth_error_thresholds=self._auth_error_thresholds(rule_flags),
+            ui_thresholds=self._ui_thresholds(rule_flags),
+            visual_thresholds=self._visual_thresholds(rule_flags, ocr_lengths)
+        )
+    
+    def _get_score_weights(self, query_analysis: Dict) -> Tuple[float, float, float]:
+        """Get the (base, content, text) score weights for the query type."""
+        if query_analysis['is_auth_error_query']:
+            return self.AUTH_ERROR_WEIGHTS
+        elif query_analysis['is_visual_query']:
+            return self.VISUAL_WEIGHTS
+        else:
+            return self.TEXT_WEIGHTS
+    
     def _analyze_query(self, query: str) -> Dict[str, Any]:
         """Analyze query to determine search strategy and content type."""
         query_lower = query.lower()
         
-        # Define content categories with keywords
-        visual_keywords = {
-            'nature': ['mountain', 'mountains', 'river', 'lake', 'forest', 'tree', 'landscape', 'nature', 'outdoor', 'scenery', 'beach', 'ocean', 'sea', 'sky', 'sunset', 'sunrise'],
-            'urban': ['building', 'city', 'street', 'road', 'architecture', 'urban', 'downtown'],
-            'people': ['person', 'people', 'man', 'woman', 'child', 'group', 'face'],
-            'objects': ['car', 'vehicle', 'food', 'animal', 'bird', 'cat', 'dog'],
-            'general_visual': ['picture', 'photo', 'image', 'show', 'display', 'view']
-        }
-        
-        ui_keywords = ['button', 'form', 'login', 'error', 'dialog', 'menu', 'interface', 'screen', 'app', 'website', 'page', 'modal', 'field', 'dropdown', 'checkbox', 'click']
-        
-        # Special high-priority combinations
-        auth_error_keywords = ['auth', 'authentication', 'login', 'password', 'sign in', 'credential', 'username']
-        error_keywords = ['error', 'warning', 'alert', 'problem', 'issue', 'failed', 'fail']
+        # One matcher pass finds every query keyword in the query
+        query_keywords = QUERY_KEYWORD_MATCHER.find(query_lower)
         
-        # Determine query type
-        is_visual_query = False
+        # Determine visual categories and extract specific content terms in one pass
         visual_categories = []
+        content_terms = []
         
-        for category, keywords in visual_keywords.items():
-            if any(keyword in query_lower for keyword in keywords):
-                is_visual_query = True
+        for category, keywords in VISUAL_KEYWORDS.items():
+            matches = [keyword for keyword in keywords if keyword in query_keywords]
+            if matches:
                 visual_categories.append(category)
+                content_terms.extend(matches)
         
-        is_ui_query = any(keyword in query_lower for keyword in ui_keywords)
+        is_visual_query = bool(visual_categories)
+        is_ui_query = not query_keywords.isdisjoint(UI_KEYWORDS)
         
         # Check for special high-priority combinations
-        has_auth_terms = any(keyword in query_lower for keyword in auth_error_keywords)
-        has_error_terms = any(keyword in query_lower for keyword in error_keywords)
+        has_auth_terms = not query_keywords.isdisjoint(AUTH_ERROR_KEYWORDS)
+        has_error_terms = not query_keywords.isdisjoint(ERROR_KEYWORDS)
         is_auth_error_query = has_auth_terms and has_error_terms
         
-        # Extract specific content terms
-        content_terms = []
-        for category, keywords in visual_keywords.items():
-            for keyword in keywords:
-                if keyword in query_lower:
-                    content_terms.append(keyword)
-        
         return {
             'is_visual_query': is_visual_query,
             'is_ui_query': is_ui_query,
             'is_auth_error_query': is_auth_error_query,
             'has_auth_terms': has_auth_terms,
             'has_error_terms': has_error_terms,
-            'visual_categories': visual_categories,
-            'content_terms': content_terms,
-            'query_lower': query_lower
+            'visual_categories': tuple(visual_categories),
+            'content_terms': tuple(content_terms),
+            'query_lower': query_lower,
+            'query_terms': tuple(query_lower.split()),
+            'query_words': tuple(w for w in query_lower.split() if len(w) > 2)
         }
     
-    def _calculate_relevance_score(self, query: str, query_analysis: Dict, screenshot: Dict, query_embedding: List) -> float:
-        """Calculate comprehensive relevance score for a screenshot."""
-        ocr_text = screenshot.get('ocr_text', '').lower()
-        visual_description = screenshot.get('visual_description', '').lower()
-        
-        # Base similarity score
-        base_score = self.image_processor.calculate_similarity(
-            query_embedding, screenshot['text_embedding']
-        )
-        
-        # Determine content type of screenshot
-        screenshot_analysis = self._analyze_screenshot_content(ocr_text, visual_description)
-        
-        # Calculate content relevance
-        content_score = self._calculate_content_relevance(
-            query_analysis, screenshot_analysis, ocr_text, visual_description
-        )
-        
-        # Calculate text matching score
-        text_score = self._calculate_text_matching(
-            query_analysis['query_lower'], ocr_text, visual_description
-        )
-        
-        # Weighted final score based on query type
+    def _select_content_scorer(self, query_analysis: Dict) -> Callable[[Dict, ScreenshotFeatures], np.ndarray]:
+        """Pick the content relevance scorer for the query type."""
         if query_analysis['is_auth_error_query']:
-            # Special handling for auth+error queries - prioritize text content
-            final_score = (
-                base_score * 0.3 +           # Moderate weight for general similarity
-                content_score * 0.2 +        # Lower weight for visual content
-                text_score * 0.5             # High weight for text matching
-            )
+            return self._score_auth_error_content
+        elif query_analysis['is_ui_query']:
+            return self._score_ui_content
         elif query_analysis['is_visual_query']:
-            # For visual queries, prioritize visual content heavily
-            final_score = (
-                base_score * 0.2 +           # Lower weight for general similarity
-                content_score * 0.6 +        # High weight for visual content relevance
-                text_score * 0.2             # Lower weight for text matching
-            )
+            return self._score_visual_content
         else:
-            # For text queries, balance all factors
-            final_score = (
-                base_score * 0.4 +
-                content_score * 0.3 +
-                text_score * 0.3
-            )
+            return self._score_neutral_content
+    
+    def _select_thresholds(self, query_analysis: Dict, features: ScreenshotFeatures) -> np.ndarray:
+        """Get the minimum score threshold of every screenshot for the query type."""
+        if query_analysis['is_auth_error_query']:
+            return features.auth_error_thresholds
+        elif query_analysis['is_ui_query']:
+            return features.ui_thresholds
+        elif query_analysis['is_visual_query']:
+            return features.visual_thresholds
+        else:
+            return np.full(len(features.ui_thresholds), self.DEFAULT_THRESHOLD)
+    
+    def _auth_error_thresholds(self, rule_flags: Dict[str, np.ndarray]) -> np.ndarray:
+        """For auth/error queries, require actual auth/error terms."""
+        has_auth_or_error_content = rule_flags['has_auth_terms'] | rule_flags['has_error_terms']
         
-        return final_score
+        # Nearly impossible threshold for irrelevant content
+        return np.where(has_auth_or_error_content, 0.2,
+                        np.where(rule_flags['has_irrelevant_terms'], 0.95, 0.6))
+    
+    def _ui_thresholds(self, rule_flags: Dict[str, np.ndarray]) -> np.ndarray:
+        """For UI queries (like "blue button"), require actual UI content."""
+        # Low threshold for actual UI content, nearly impossible for
+        # nature/character images, high for other non-UI content
+        return np.where(rule_flags['has_ui_content_terms'], 0.2,
+                        np.where(rule_flags['has_irrelevant_terms'], 0.95, 0.7))
     
-    def _analyze_screenshot_content(self, ocr_text: str, visual_description: str) -> Dict[str, Any]:
-        """Analyze what type of content is in the screenshot."""
-        # UI/Interface indicators
-        ui_indicators = ['button', 'form', 'login', 'error', 'dialog', 'menu', 'interface', 'click', 'text field', 'dropdown', 'checkbox', 'authentication', 'password', 'username', 'sign in', 'alert', 'warning']
-        
-        # Visual content indicators
-        nature_indicators = ['mountain', 'river', 'lake', 'forest', 'tree', 'landscape', 'nature', 'outdoor', 'scenery', 'beach', 'ocean', 'sea', 'sky', 'sunset', 'sunrise', 'valley', 'peak', 'hill']
-        urban_indicators = ['building', 'city', 'street', 'road', 'architecture', 'urban', 'downtown', 'skyscraper']
-        people_indicators = ['person', 'people', 'man', 'woman', 'child', 'face', 'group', 'individual']
-        
-        combined_text = f"{ocr_text} {visual_description}"
-        
-        # Count indicators
-        ui_count = sum(1 for indicator in ui_indicators if indicator in combined_text)
-        nature_count = sum(1 for indicator in nature_indicators if indicator in combined_text)
-        urban_count = sum(1 for indicator in urban_indicators if indicator in combined_text)
-        people_count = sum(1 for indicator in people_indicators if indicator in combined_text)
-        
-        # Determine primary content type
-        is_primarily_ui = ui_count > 2 or len(ocr_text) > len(visual_description) * 2
-        has_nature_content = nature_count > 0
-        has_urban_content = urban_count > 0
-        has_people_content = people_count > 0
+    def _visual_thresholds(self, rule_flags: Dict[str, np.ndarray], ocr_lengths: np.ndarray) -> np.ndarray:
+        """For nature/landscape queries, exclude UI screenshots."""
+        has_ui_content = rule_flags['has_visual_ui_terms'] & (ocr_lengths > 20)
         
-        return {
-            'is_primarily_ui': is_primarily_ui,
-            'has_nature_content': has_nature_content,
-            'has_urban_content': has_urban_content,
-            'has_people_content': has_people_content,
-            'nature_count': nature_count,
-            'ui_count': ui_count,
-            'text_to_visual_ratio': len(ocr_text) / max(len(visual_description), 1)
-        }
+        # High threshold for UI content on nature queries, normal for visual content
+        return np.where(has_ui_content, 0.8, 0.1)
     
-    def _get_minimum_threshold(self, query_analysis: Dict, score: float, screenshot: Dict) -> float:
-        """Get minimum threshold based on query type and screenshot content."""
-        ocr_text = screenshot.get('ocr_text', '').lower()
-        visual_description = screenshot.get('visual_description', '').lower()
-        combined_text = f"{ocr_text} {visual_description}"
+    def _auth_error_content_scores(self, rule_flags: Dict[str, np.ndarray]) -> np.ndarray:
+        """Score content for auth+error queries; the scores do not depend on the query."""
+        # Strict matching for auth and error terms
+        auth_found = rule_flags['has_auth_terms']
+        error_found = rule_flags['has_strict_error_terms']
         
-        # Define irrelevant content patterns
-        nature_patterns = ['landscape', 'mountain', 'river', 'scenic', 'photograph', 'nature', 'outdoor', 'sunset', 'sunrise', 'valley', 'peak', 'hill', 'forest', 'tree']
-        character_patterns = ['panda', 'cartoon', 'cute', 'kawaii', 'character', 'illustration', 'animal']
-        irrelevant_patterns = nature_patterns + character_patterns
+        scores = np.where(auth_found, 0.7, 0.0)
+        scores = scores + np.where(error_found, 0.7, 0.0)
         
-        if query_analysis['is_auth_error_query']:
-            # For auth/error queries, require actual auth/error terms
-            has_auth_content = any(term in combined_text for term in ['auth', 'authentication', 'login', 'password', 'sign in', 'username', 'credential'])
-            has_error_content = any(term in combined_text for term in ['error', 'failed', 'warning', 'alert', 'problem', 'invalid'])
-            
-            if has_auth_content or has_error_content:
-                return 0.2
-            elif any(pattern in combined_text for pattern in irrelevant_patterns):
-                return 0.95  # Nearly impossible threshold
-            else:
-                return 0.6
-        
-        elif query_analysis['is_ui_query'] or any(ui_term in query_analysis['query_lower'] for ui_term in ['button', 'form', 'interface', 'menu', 'dialog', 'modal']):
-            # For UI queries (like "blue button"), require actual UI content
-            has_ui_content = any(term in combined_text for term in ['button', 'form', 'interface', 'menu', 'dialog', 'modal', 'click', 'field', 'dropdown', 'checkbox', 'ui elements', 'sign in', 'login'])
-            
-            if has_ui_content:
-                return 0.2  # Low threshold for actual UI content
-            elif any(pattern in combined_text for pattern in irrelevant_patterns):
-                return 0.95  # Nearly impossible threshold for nature/character images
-            else:
-                return 0.7  # High threshold for non-UI content
+        # Bonus for having both auth and error content
+        scores = scores + np.where(auth_found & error_found, 0.5, 0.0)  # Total possible: 1.9
         
-        elif query_analysis['is_visual_query']:
-            # For nature/landscape queries, exclude UI screenshots
-            has_ui_content = any(term in combined_text for term in ['button', 'form', 'login', 'interface', 'dialog', 'menu']) and len(ocr_text) > 20
-            
-            if has_ui_content:
-                return 0.8  # High threshold for UI content on nature queries
-            else:
-                return 0.1  # Normal threshold for visual content
+        # Heavy penalty for clearly irrelevant content
+        scores = np.where(rule_flags['has_non_auth_terms'], 0.0, scores)
         
-        else:
-            return 0.2  # Default threshold
+        return np.minimum(scores, 1.5)  # Cap at 1.5 for exceptional matches
     
-    def _calculate_content_relevance(self, query_analysis: Dict, screenshot_analysis: Dict, ocr_text: str, visual_description: str) -> float:
-        """Calculate how well screenshot content matches query intent."""
-        
-        # Special handling for auth+error queries
-        if query_analysis['is_auth_error_query']:
-            score = 0.0
-            combined_text = f"{ocr_text} {visual_description}".lower()
-            
-            # Strict matching for auth terms
-            auth_terms = ['auth', 'authentication', 'login', 'password', 'sign in', 'username', 'credential']
-            auth_found = any(term in combined_text for term in auth_terms)
-            
-            # Strict matching for error terms
-            error_terms = ['error', 'failed', 'warning', 'alert', 'problem', 'invalid', 'incorrect']
-            error_found = any(term in combined_text for term in error_terms)
-            
-            if auth_found:
-                score += 0.7
-            if error_found:
-                score += 0.7
-            
-            # Bonus for having both auth and error content
-            if auth_found and error_found:
-                score += 0.5  # Total possible: 1.9
-            
-            # Heavy penalty for clearly irrelevant content
-            irrelevant_terms = ['landscape', 'mountain', 'panda', 'cartoon', 'cute', 'kawaii', 'scenic', 'photograph', 'nature', 'animal']
-            if any(term in combined_text for term in irrelevant_terms):
-                score = 0.0  # Zero out completely irrelevant content
-            
-            return min(score, 1.5)  # Cap at 1.5 for exceptional matches
+    def _score_auth_error_content(self, query_analysis: Dict, features: ScreenshotFeatures) -> np.ndarray:
+        """Score content for auth+error queries."""
+        return features.auth_error_content_scores
+    
+    def _score_ui_content(self, query_analysis: Dict, features: ScreenshotFeatures) -> np.ndarray:
+        """Score content for UI-focused queries."""
+        # For UI-focused queries, heavily reward UI content and penalize nature content
+        scores = np.where(features.has_ui_terms, 0.8, 0.0)
         
-        elif query_analysis['is_ui_query'] or any(ui_term in query_analysis['query_lower'] for ui_term in ['button', 'form', 'interface', 'menu', 'dialog', 'modal']):
-            # For UI-focused queries, heavily reward UI content and penalize nature content
-            score = 0.0
-            combined_text = f"{ocr_text} {visual_description}".lower()
-            
-            # Reward UI content
-            ui_terms = ['button', 'form', 'interface', 'menu', 'dialog', 'modal', 'click', 'field', 'dropdown', 'checkbox', 'ui elements']
-            ui_found = any(term in combined_text for term in ui_terms)
-            
-            if ui_found:
-                score += 0.8
-                # Bonus for specific query terms
-                query_words = query_analysis['query_lower'].split()
-                for word in query_words:
-                    if word in combined_text:
-                        score += 0.3
-            
-            # Heavy penalty for nature/landscape content
-            nature_terms = ['landscape', 'mountain', 'scenic', 'photograph', 'nature', 'outdoor', 'panda', 'cartoon', 'character']
-            if any(term in combined_text for term in nature_terms):
-                score = 0.0  # Zero out nature content for UI queries
-            
-            return min(score, 1.5)
+        # Bonus for specific query terms; words have no spaces, so a match in
+        # the combined text is a match in the OCR text or the description
+        for word in query_analysis['query_terms']:
+            found = features.ocr_index.contains(word) | features.visual_index.contains(word)
+            scores = scores + np.where(features.has_ui_terms & found, 0.3, 0.0)
         
-        elif query_analysis['is_visual_query']:
-            # For visual queries, heavily penalize UI-heavy screenshots
-            if screenshot_analysis['is_primarily_ui']:
-                return 0.1  # Very low score for UI content on visual queries
-            
-            # Reward visual content matches
-            score = 0.0
-            
-            # Check for specific content matches
-            if 'nature' in query_analysis['visual_categories']:
-                if screenshot_analysis['has_nature_content']:
-                    score += 0.8
-                    # Specific nature term bonuses
-                    for term in query_analysis['content_terms']:
-                        if term in visual_description:
-                            score += 0.4
-                        elif term in ocr_text:
-                            score += 0.1  # Much lower for text matches
-                else:
-                    return 0.2  # Low score if no nature content for nature query
-            
-            if 'urban' in query_analysis['visual_categories']:
-                if screenshot_analysis['has_urban_content']:
-                    score += 0.8
-                    for term in query_analysis['content_terms']:
-                        if term in visual_description:
-                            score += 0.4
-            
-            if 'people' in query_analysis['visual_categories']:
-                if screenshot_analysis['has_people_content']:
-                    score += 0.8
-            
-            return min(score, 1.0)
+        # Heavy penalty for nature/landscape content
+        scores = np.where(features.has_non_ui_terms, 0.0, scores)
         
-        else:
-            # For non-visual queries, standard content matching
-            return 0.5  # Neutral score
+        return np.minimum(scores, 1.5)
     
-    def _calculate_text_matching(self, query_lower: str, ocr_text: str, visual_description: str) -> float:
-        """Calculate text-based matching score."""
-        score = 0.0
+    def _score_visual_content(self, query_analysis: Dict, features: ScreenshotFeatures) -> np.ndarray:
+        """Score content for visual queries."""
+        # Reward visual content matches
+        scores = np.zeros(len(features.is_primarily_ui))
+        
+        # Check for specific content matches
+        content_terms = query_analysis['content_terms']
+        in_visual = [features.visual_index.contains(term) for term in content_terms]
+        
+        missing_nature = np.zeros(len(scores), dtype=bool)
+        if 'nature' in query_analysis['visual_categories']:
+            has_nature = features.has_nature_content
+            scores = scores + np.where(has_nature, 0.8, 0.0)
+            # Specific nature term bonuses, much lower for text matches
+            for term, term_in_visual in zip(content_terms, in_visual):
+                term_in_ocr = features.ocr_index.contains(term)
+                scores = scores + np.where(has_nature & term_in_visual, 0.4,
+                                           np.where(has_nature & term_in_ocr, 0.1, 0.0))
+            missing_nature = ~has_nature
+        
+        if 'urban' in query_analysis['visual_categories']:
+            has_urban = features.has_urban_content
+            scores = scores + np.where(has_urban, 0.8, 0.0)
+            for term_in_visual in in_visual:
+                scores = scores + np.where(has_urban & term_in_visual, 0.4, 0.0)
+        
+        if 'people' in query_analysis['visual_categories']:
+            scores = scores + np.where(features.has_people_content, 0.8, 0.0)
+        
+        # Very low score for UI content, low score if no nature content for nature query
+        return np.where(features.is_primarily_ui, 0.1,
+                        np.where(missing_nature, 0.2, np.minimum(scores, 1.0)))
+    
+    def _score_neutral_content(self, query_analysis: Dict, features: ScreenshotFeatures) -> np.ndarray:
+        """For non-visual queries, standard content matching."""
+        return np.full(len(features.is_primarily_ui), 0.5)  # Neutral score
+    
+    def _calculate_text_matching(self, query_analysis: Dict, features: ScreenshotFeatures) -> np.ndarray:
+        """Calculate text-based matching scores."""
+        query_lower = query_analysis['query_lower']
+        query_words = query_analysis['query_words']
         
         # Exact query match
-        if query_lower in visual_description:
-            score += 0.8
-        elif query_lower in ocr_text:
-            score += 0.6
+        scores = np.where(features.visual_index.contains(query_lower), 0.8,
+                          np.where(features.ocr_index.contains(query_lower), 0.6, 0.0))
         
         # Word-by-word matching
-        query_words = [w for w in query_lower.split() if len(w) > 2]
         if query_words:
-            visual_matches = sum(1 for word in query_words if word in visual_description)
-            ocr_matches = sum(1 for word in query_words if word in ocr_text)
+            visual_matches = sum(features.visual_index.contains(word).astype(int) for word in query_words)
+            ocr_matches = sum(features.ocr_index.contains(word).astype(int) for word in query_words)
             
             visual_ratio = visual_matches / len(query_words)
             ocr_ratio = ocr_matches / len(query_words)
             
-            score += visual_ratio * 0.4 + ocr_ratio * 0.2
+            scores = scores + (visual_ratio * 0.4 + ocr_ratio * 0.2)
         
-        return min(score, 1.0)
+        return np.minimum(scores, 1.0)
     
     def _find_matched_elements(self, query: str, query_analysis: Dict, screenshot: Dict) -> List[str]:
         """Find specific elements that match the query."""
         matched_elements = []
         
-        ocr_text = screenshot.get('ocr_text', '').lower()
-        visual_description = screenshot.get('visual_description', '').lower()
+        ocr_text = screenshot['ocr_text_lower']
+        visual_description = screenshot['visual_description_lower']
         query_lower = query_analysis['query_lower']
         
         # Exact matches
@@ -372,39 +445,33 @@ class SearchService:
         for category in query_analysis['visual_categories']:
             matched_elements.append(f"Content type: {category}")
         
-        # Specific term matches
+        # Specific term matches, located when the screenshot was analyzed
+        term_locations = screenshot['content_analysis']['term_locations']
         for term in query_analysis['content_terms']:
-            if term in visual_description:
+            location = term_locations.get(term)
+            if location == 'visual':
                 matched_elements.append(f"Visual element: {term}")
-            elif term in ocr_text:
+            elif location == 'ocr':
                 matched_elements.append(f"Text element: {term}")
         
         return matched_elements[:5] if matched_elements else ["General content match"]
     
     def search_by_text(self, query: str, limit: int = 5) -> List[SearchResult]:
         """Search by text content only."""
-        screenshots = self.db_manager.get_all_processed_screenshots()
-        
-        matched_results = []
         query_lower = query.lower()
         
-        for screenshot in screenshots:
-            ocr_text = screenshot.get('ocr_text', '').lower()
-            
-            if query_lower in ocr_text:
-                score = len(query_lower) / max(len(ocr_text), 1)
-                
-                result = SearchResult(
-                    id=screenshot['id'],
-                    filename=screenshot['filename'],
-                    confidence_score=round(score * 100, 1),
-                    preview_url=f"/uploads/{os.path.basename(screenshot['file_path'])}",
-                    ocr_text=screenshot.get('ocr_text', ''),
-                    visual_description=screenshot.get('visual_description', ''),
-                    matched_elements=[f"Text match: '{query}'"]
-                )
-                
-                matched_results.append((score, result))
-        
-        matched_results.sort(key=lambda x: x[0], reverse=True)
-        return [result for _, result in matched_results[:limit]]
\ No newline at end of file
+        # The database finds and orders the screenshots whose OCR text contains the query
+        results = []
+        for screenshot in self.db_manager.find_screenshots_by_text(query_lower, limit):
+            score = len(query_lower) / max(screenshot['text_length'], 1)
+            results.append(SearchResult(
+                id=screenshot['id'],
+                filename=screenshot['filename'],
+                confidence_score=round(score * 100, 1),
+                preview_url=screenshot['preview_url'],
+                ocr_text=screenshot.get('ocr_text', ''),
+                visual_description=screenshot.get('visual_description', ''),
+                matched_elements=[f"Text match: '{query}'"]
+            ))
+        
+        return results
@@ -0,0 +1,56 @@
+import bisect
+from typing import List
+import numpy as np
+from services.cache import LRUCache
+
+class TextIndex:
+    """Find which of a list of texts contain a substring with one scan.
+
+    The texts are joined into a single string, so a search runs in C over
+    the whole corpus instead of one Python `in` check per text.
+    """
+
+    # Never appears in OCR text or descriptions, so matches cannot span two texts
+    SEPARATOR = '\x00'
+
+    # Number of substring masks kept (N bytes each); query words repeat across searches
+    MASK_CACHE_SIZE = 256
+
+    def __init__(self, texts: List[str]):
+        self.texts = texts
+        self._haystack = self.SEPARATOR.join(texts)
+        self._starts = []
+        offset = 0
+        for text in texts:
+            self._starts.append(offset)
+            offset += len(text) + 1
+
+        # Masks are only valid for these texts, so the cache lives with the index
+        self._mask_cache = LRUCache(maxsize=self.MASK_CACHE_SIZE)
+
+    def find(self, needle: str) -> List[int]:
+        """Get the indices of the texts containing needle, in order."""
+        if not self.texts or self.SEPARATOR in needle:
+            return []
+
+        # str.find skips non-matching texts in C; resume at the next text after a hit
+        matches = []
+        position = self._haystack.find(needle)
+        while position != -1:
+            index = bisect.bisect_right(self._starts, position) - 1
+            matches.append(index)
+            if index + 1 == len(self._starts):
+                break
+            position = self._haystack.find(needle, self._starts[index + 1])
+
+        return matches
+
+    def contains(self, needle: str) -> np.ndarray:
+        """Get a read-only boolean mask of the texts containing needle."""
+        mask = self._mask_cache.get(needle)
+        if mask is None:
+            mask = np.zeros(len(self.texts), dtype=bool)
+            mask[self.find(needle)] = True
+            mask.flags.writeable = False
+            self._mask_cache.put(needle, mask)
+        return mask
@@ -12,12 +12,16 @@ if __name__ == "__main__":
     
     print(f"Starting Visual Memory Search API on {host}:{port}")
     
+    # Each worker loads its own embedding model and holds its own embedding
+    # matrix and search caches, so more workers multiply memory use
+    workers = int(os.environ.get("WEB_CONCURRENCY", 1))
+    
     # Run with production settings
     uvicorn.run(
         "main:app",
         host=host,
         port=port,
-        workers=1,  # Single worker for simplicity
-        access_log=True,
+        workers=workers,
+        access_log=False,  # Disable access logs for performance
         log_level="info"
     )
\ No newline at end of file
@@ -7,13 +7,24 @@ This file tests the search algorithm against real uploaded images to ensure prop
 import asyncio
 import sys
 import os
+import shutil
+import tempfile
 sys.path.append('.')
 
-from database import DatabaseManager
+import database
+from database import DatabaseManager, init_db
 from services.search_service import SearchService
 
 class SearchTestSuite:
     def __init__(self):
+        # Search a temporary copy of the database, as migrations rewrite it in place
+        self._temp_dir = tempfile.TemporaryDirectory()
+        fixture_path = database.DATABASE_PATH
+        database.DATABASE_PATH = os.path.join(self._temp_dir.name, os.path.basename(fixture_path))
+        shutil.copy(fixture_path, database.DATABASE_PATH)
+        
+        # Apply schema migrations before searching
+        init_db()
         self.db_manager = DatabaseManager()
         self.search_service = SearchService(self.db_manager)
         
@@ -68,13 +79,21 @@ class SearchTestSuite:
         passed = 0
         total = len(test_cases)
         
-        for i, test_case in enumerate(test_cases, 1):
+        # Searches share the service and its caches, so run them concurrently
+        # and report in order
+        outcomes = await asyncio.gather(
+            *(test_case['test_function'](test_case) for test_case in test_cases),
+            return_exceptions=True
+        )
+        
+        for i, (test_case, result) in enumerate(zip(test_cases, outcomes), 1):
             print(f"\n📋 Test {i}/{total}: {test_case['name']}")
             print(f"Query: '{test_case['query']}'")
             print(f"Expected: {test_case['expected_behavior']}")
             
             try:
-                result = await test_case['test_function'](test_case)
+                if isinstance(result, Exception):
+                    raise result
                 if result['passed']:
                     print("✅ PASSED")
                     passed += 1